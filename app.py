@@ -1,17 +1,21 @@
 from flask import Flask, render_template, request
-import numpy as np
 from datetime import datetime
 import sqlite3
 import os
+import queue
+import threading
+import time
+import atexit
 from flask_moment import Moment
 
 # Modular services for NLP and inference
-from nlp.preprocess import clean_text, enhanced_clean_text, extract_content_features
-from services.model_service import LSTMService, EnsembleService
+from nlp.patterns import URL_RE, lower_for_matching
+from nlp.preprocess import enhanced_clean_text, load_stem_table
+from services.model_service import LSTMService, EnsembleService, configure_tf_threading
 from services.url_intel import extract_urls, analyze_urls, compute_url_risk
 from services.header_auth import parse_auth_headers
 from services.homograph import detect_homograph
-from services.heuristics import phishing_phrase_score, display_name_domain_mismatch, apply_allowlist, comprehensive_content_analysis
+from services.heuristics import display_name_domain_mismatch, apply_allowlist, comprehensive_content_analysis
 import pickle
 
 
@@ -23,10 +27,31 @@ moment = Moment(app)
 DB_PATH = os.path.join("model", "predictions.db")
 os.makedirs("model", exist_ok=True)
 
+# Per-connection tuning: WAL allows readers alongside the writer and
+# synchronous=NORMAL avoids an fsync on every commit
+_DB_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=30000000000;
+    PRAGMA cache_size=-64000;
+"""
+
+
+def _open_db():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.executescript(_DB_PRAGMAS)
+    return conn
+
+
+# 🔹 One long-lived connection shared by all requests; the lock serializes
+# access so statements from different threads never interleave
+_DB = _open_db()
+_DB_LOCK = threading.Lock()
+
 # 🔹 Create DB table if not exists
-conn = sqlite3.connect(DB_PATH)
-c = conn.cursor()
-c.execute('''
+# journal_mode is persistent in the database file, so set it once here
+_DB.execute("PRAGMA journal_mode=WAL")
+_DB.execute('''
     CREATE TABLE IF NOT EXISTS predictions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         message TEXT,
@@ -36,23 +61,93 @@ c.execute('''
         timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
     )
 ''')
-conn.commit()
-conn.close()
+_DB.commit()
+
+# 🔹 Predictions are queued and written by a background thread in batches,
+# so a burst of requests costs one transaction per flush instead of one
+# commit per request
+_PRED_QUEUE = queue.Queue()
+_PRED_FLUSH_ROWS = 128
+_PRED_FLUSH_SECONDS = 0.1
+
+
+def _flush_predictions(rows):
+    if not rows:
+        return
+    with _DB_LOCK:
+        _DB.executemany("INSERT INTO predictions (message, prediction, category, spam_score) VALUES (?, ?, ?, ?)", rows)
+        _DB.commit()
+
+
+def _prediction_writer():
+    while True:
+        rows = [_PRED_QUEUE.get()]
+        deadline = time.monotonic() + _PRED_FLUSH_SECONDS
+        while len(rows) < _PRED_FLUSH_ROWS:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(_PRED_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            _flush_predictions(rows)
+        except sqlite3.Error:
+            app.logger.exception("Failed to store %d predictions", len(rows))
+
+
+def _drain_predictions():
+    rows = []
+    while True:
+        try:
+            rows.append(_PRED_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    _flush_predictions(rows)
+
+
+threading.Thread(target=_prediction_writer, name="prediction-writer", daemon=True).start()
+atexit.register(_drain_predictions)
 
 # 🔹 Load ML artifacts
-# LSTM model service wraps the Keras model and tokenizer for prediction
+# Thread pools must be sized before TensorFlow runs its first op
+configure_tf_threading(
+    intra_op_threads=int(os.environ.get('TF_INTRA_OP_THREADS', 0)) or None,
+    inter_op_threads=int(os.environ.get('TF_INTER_OP_THREADS', 1))
+)
+
+# LSTM model service wraps the model and tokenizer for prediction. The
+# quantized TFLite export is preferred; models retrained with the notebook
+# are saved in the .keras format, older ones as .h5
+MODEL_PATH = next((path for path in ('model/lstm_model.tflite', 'model/lstm_model.keras') if os.path.exists(path)),
+                  'model/lstm_model.h5')
+# Compact JSON vocab (services.model_service.save_vocab), else the pickled Tokenizer
+TOKENIZER_PATH = 'model/vocab.json' if os.path.exists('model/vocab.json') else 'model/tokenizer.pkl'
 lstm_service = LSTMService(
-    model_path='model/lstm_model.h5',
-    tokenizer_path='model/tokenizer.pkl',
-    max_len=100
+    model_path=MODEL_PATH,
+    tokenizer_path=TOKENIZER_PATH,
+    max_len=100,
+    max_batch=int(os.environ.get('LSTM_MAX_BATCH', 32)),
+    max_wait_ms=float(os.environ.get('LSTM_BATCH_WAIT_MS', 2.0)),
+    lazy=os.environ.get('LSTM_PRELOAD', '0') != '1'
 )
 
+# Stem the model vocabulary once so per-request preprocessing is mostly dict lookups
+load_stem_table(lstm_service.tokenizer.word_index,
+                stems=getattr(lstm_service.tokenizer, 'stem_table', None))
+
 # Optional: soft-voting ensemble to blend URL risk with LSTM score
 ensemble = EnsembleService(lstm_service=lstm_service, url_weight=0.15)
 
 # Multi-class label encoder for threat category
 with open('model/category_encoder.pkl', 'rb') as f:
     category_encoder = pickle.load(f)
+# classes_ never changes, so index it directly instead of calling inverse_transform per request
+CATEGORY_LABELS = [str(label) for label in category_encoder.classes_]
+# The notebook files every ham message under 'None'; encoders without that
+# class fall back to the generic label
+HAM_CATEGORY = 'None' if 'None' in CATEGORY_LABELS else 'General'
 
 @app.route('/')
 def home():
@@ -63,9 +158,14 @@ def predict():
     message = request.form['message']
     raw_headers = request.form.get('headers', '').strip()
 
+    # Body URLs and the lowercased body are computed once and shared by the
+    # content features and heuristics
+    body_urls = URL_RE.findall(message)
+    message_lower = lower_for_matching(message)
+
     # ---------- Enhanced NLP Preprocessing ----------
     # Use enhanced preprocessing that preserves important spam indicators
-    cleaned_text, content_features = enhanced_clean_text(message)
+    cleaned_text, content_features = enhanced_clean_text(message, urls=body_urls, text_lower=message_lower)
 
     # ---------- URL/Domain Intelligence ----------
     urls_in_message = extract_urls(message)
@@ -80,31 +180,23 @@ def predict():
         homograph_info = detect_homograph(first_host)
         # Fold homograph into URL risk lightly
         extra_risk = (homograph_info.get('homograph_risk', 0.0) if homograph_info else 0.0)
-        url_risk_score = float(np.clip(url_risk_score + extra_risk, 0.0, 1.0))
+        url_risk_score = min(1.0, max(0.0, url_risk_score + extra_risk))
 
     # ---------- Enhanced Content Analysis ----------
     # Parse headers before blending to incorporate header risk
     header_findings = parse_auth_headers(raw_headers)
     
     # Enhanced heuristic analysis
-    comprehensive_analysis = comprehensive_content_analysis(message)
+    comprehensive_analysis = comprehensive_content_analysis(message, urls=body_urls, text_lower=message_lower)
     phrase_score = comprehensive_analysis.get('phishing_phrases', 0.0)
     display_mismatch = display_name_domain_mismatch(raw_headers)
     
     # Merge content features with comprehensive analysis
     content_features.update(comprehensive_analysis)
 
-    # ---------- LSTM Prediction (+ enhanced ensemble) ----------
-    blended = ensemble.blend(cleaned_text=cleaned_text,
-                             url_risk_score=url_risk_score,
-                             header_findings=header_findings,
-                             phrase_score=phrase_score,
-                             display_mismatch=display_mismatch,
-                             content_features=content_features)
-    spam_prob = blended['spam_prob']
-    category_probs = np.array(blended['category_probs']) if blended['category_probs'] else np.array([])
-
     # ---------- Enhanced Rule-based safety overrides ----------
+    # Evaluated before blending: when one of them will fire, the ensemble
+    # must not skip the LSTM, or the forced Spam result has no category
     has_risky_url = any([
         (u.get('is_suspicious_tld') or u.get('has_ip_host') or (u.get('path_depth', 0) or 0) > 4 or u.get('long_query'))
         for u in (url_findings or [])
@@ -117,7 +209,7 @@ def predict():
         header_fail = (dmarc == 'fail') or ((spf == 'fail') and (dkim == 'fail'))
 
     # Enhanced content-only detection rules
-    content_risk_score = blended.get('content_risk', 0.0)
+    content_risk_score = ensemble.content_risk(content_features)
     has_high_content_risk = content_risk_score > 0.6
     
     # Strong content indicators
@@ -128,6 +220,20 @@ def predict():
     # Multiple strong indicators = very likely spam
     strong_indicators = sum([has_urgency, has_winner_indicators, has_suspicious_actions, has_risky_url])
     
+    override_pending = (header_fail or (has_risky_url and url_risk_score > 0.40)
+                        or strong_indicators >= 2 or has_high_content_risk)
+
+    # ---------- LSTM Prediction (+ enhanced ensemble) ----------
+    blended = ensemble.blend(cleaned_text=cleaned_text,
+                             url_risk_score=url_risk_score,
+                             header_findings=header_findings,
+                             phrase_score=phrase_score,
+                             display_mismatch=display_mismatch,
+                             content_features=content_features,
+                             allow_short_circuit=not override_pending)
+    spam_prob = blended['spam_prob']
+    category_probs = blended['category_probs'] or []
+
     if header_fail and has_risky_url:
         spam_prob = max(spam_prob, 0.90)
     elif header_fail or (has_risky_url and url_risk_score > 0.40):
@@ -149,19 +255,23 @@ def predict():
     notspam_pct = round((1 - spam_prob) * 100, 2)
 
     # Classify spam type if model provides category distribution
-    if category_probs.size:
-        predicted_category_index = int(np.argmax(category_probs))
-        predicted_category = category_encoder.inverse_transform([predicted_category_index])[0]
+    if category_probs:
+        # Only a handful of classes: a plain max() beats building a NumPy array
+        predicted_category_index = max(range(len(category_probs)), key=category_probs.__getitem__)
+        predicted_category = CATEGORY_LABELS[predicted_category_index]
+    elif blended.get('short_circuit') and prediction == "Not Spam":
+        # Decided without the LSTM: report the encoder's ham class
+        predicted_category = HAM_CATEGORY
     else:
         predicted_category = 'General'
 
-    # Store in DB
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT INTO predictions (message, prediction, category, spam_score) VALUES (?, ?, ?, ?)",
-              (message, prediction, predicted_category, spam_pct))
-    conn.commit()
-    conn.close()
+    # Store in DB (written asynchronously by the prediction writer). When the
+    # LSTM was skipped the score is only the blend's midpoint estimate, so the
+    # score and category are recorded as unknown (NULL)
+    if blended['raw_spam_prob'] is None:
+        _PRED_QUEUE.put((message, prediction, None, None))
+    else:
+        _PRED_QUEUE.put((message, prediction, predicted_category, spam_pct))
 
     # ⏰ Add current UTC time for moment.js
     current_time = datetime.utcnow()
@@ -182,11 +292,8 @@ def predict():
 
 @app.route('/history')
 def history():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT message, prediction, category, spam_score, timestamp FROM predictions ORDER BY id DESC LIMIT 10")
-    rows = c.fetchall()
-    conn.close()
+    with _DB_LOCK:
+        rows = _DB.execute("SELECT message, prediction, category, spam_score, timestamp FROM predictions ORDER BY id DESC LIMIT 10").fetchall()
     return render_template("history.html", predictions=rows)
 
 if __name__ == '__main__':
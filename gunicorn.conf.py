@@ -0,0 +1,17 @@
+import multiprocessing
+import os
+
+# gevent workers let one process overlap many slow clients and DB/header I/O;
+# each worker still runs its own LSTM runtime, so keep the count modest (with
+# the TFLite export and ai-edge-litert installed, workers skip TensorFlow and
+# share the mmapped weights)
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, multiprocessing.cpu_count() // 2)))
+worker_class = 'gevent'
+# Each worker sizes its TensorFlow intra-op pool (or TFLite interpreter
+# threads) from TF_INTRA_OP_THREADS, which otherwise defaults to every CPU;
+# split the cores between workers unless it is set explicitly
+if 'TF_INTRA_OP_THREADS' not in os.environ:
+    raw_env = [f"TF_INTRA_OP_THREADS={max(1, multiprocessing.cpu_count() // workers)}"]
+worker_connections = 1000
+timeout = 60
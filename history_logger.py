@@ -1,8 +1,18 @@
 import sqlite3
 from datetime import datetime
 
+DB_PATH = 'model/predictions.db'
+
+
+def _open_db():
+    conn = sqlite3.connect(DB_PATH)
+    conn.executescript("PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; "
+                       "PRAGMA mmap_size=30000000000; PRAGMA cache_size=-64000;")
+    return conn
+
 def init_db():
-    conn = sqlite3.connect('model/predictions.db')
+    conn = _open_db()
+    conn.execute("PRAGMA journal_mode=WAL")
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS history 
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -16,7 +26,7 @@ def init_db():
     conn.close()
 
 def log_prediction(message, prediction, category, spam_score, notspam_score):
-    conn = sqlite3.connect('model/predictions.db')
+    conn = _open_db()
     c = conn.cursor()
     c.execute('''INSERT INTO history (message, prediction, category, spam_score, notspam_score, time)
                  VALUES (?, ?, ?, ?, ?, ?)''',
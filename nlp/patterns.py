@@ -0,0 +1,24 @@
+import re
+
+
+# Regexes shared by preprocessing and the heuristics services, compiled once.
+# The URL and tag patterns exclude NUL so clean_text_batch can use it as a
+# message separator without matches running across messages.
+URL_RE = re.compile(r"https?://[^\s\x00]+|www\.[^\s\x00]+", re.IGNORECASE)
+HTML_TAG_RE = re.compile(r"<[^>\x00]+>")
+
+# Non-ASCII letters that re.IGNORECASE matches against ASCII letters, which
+# str.lower() leaves alone (or, for the dotted capital I, expands to two chars)
+_ASCII_CASE_FOLDS = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's', 'K': 'k'})
+
+
+def lower_for_matching(text: str) -> str:
+    """
+    Lowercase `text` once for the keyword scans. An all-lowercase pattern
+    compiled without re.IGNORECASE finds the same matches in the result as the
+    IGNORECASE version finds in `text`, and re's case-insensitive search is
+    several times slower than a case-sensitive one.
+    """
+    if not text.isascii():
+        text = text.translate(_ASCII_CASE_FOLDS)
+    return text.lower()
@@ -1,36 +1,74 @@
 import re
 import html
-from typing import List, Dict, Tuple
+from functools import lru_cache
+from typing import List, Dict, Iterable, Optional, Tuple
 
 from nltk.stem import PorterStemmer
 
+from nlp.patterns import HTML_TAG_RE, URL_RE, lower_for_matching
+from nlp.text_stats import char_stats
+from nlp.text_cache import lru_cache_short
+
 
 # Ensure NLTK resources are available at runtime
 # No corpus downloads; use lightweight stemming and a static stopword list
 
 
-_url_pattern = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+# clean_text_batch joins messages on NUL; the shared URL and tag patterns
+# never match across it
+_BATCH_SEPARATOR = "\x00"
+_url_pattern = URL_RE
 _email_pattern = re.compile(r"[\w\.-]+@[\w\.-]+", re.IGNORECASE)
-_html_tag_pattern = re.compile(r"<[^>]+>")
+_html_tag_pattern = HTML_TAG_RE
 _token_pattern = re.compile(r"[a-z]{2,}")
 _phone_pattern = re.compile(r"[\+]?[1-9]?[0-9]{7,15}")
 _currency_pattern = re.compile(r"[\$€£¥]\s*[\d,]+\.?\d*")
-_urgent_pattern = re.compile(r"\b(urgent|immediate|asap|emergency|critical|expire|expired|expiring|deadline|limited time|act now|click now|verify now)\b", re.IGNORECASE)
-_winner_pattern = re.compile(r"\b(winner|won|prize|reward|lottery|jackpot|million|billion|free|gift|bonus)\b", re.IGNORECASE)
-_suspicious_domain_pattern = re.compile(r"\b(verify|secure|update|confirm|restore|login|account|payment|billing|support|service|security|alert|warning)\b", re.IGNORECASE)
+# Keyword patterns are all lowercase and run case-sensitively on
+# lower_for_matching() output
+_urgent_pattern = re.compile(r"\b(urgent|immediate|asap|emergency|critical|expire|expired|expiring|deadline|limited time|act now|click now|verify now)\b")
+_winner_pattern = re.compile(r"\b(winner|won|prize|reward|lottery|jackpot|million|billion|free|gift|bonus)\b")
+_suspicious_domain_pattern = re.compile(r"\b(verify|secure|update|confirm|restore|login|account|payment|billing|support|service|security|alert|warning)\b")
 
 # Static English stopwords (subset for performance, no download needed)
-STOP_WORDS = {
+STOP_WORDS = frozenset({
     'a','an','the','and','or','but','if','while','with','to','from','in','on','at','by','for','of','off','out','up','down','over','under',
     'is','am','are','was','were','be','been','being','do','does','did','doing','have','has','had','having','can','could','should','would','may','might','must','will',
     'i','me','my','myself','we','our','ours','ourselves','you','your','yours','yourself','yourselves','he','him','his','himself','she','her','hers','herself','it','its','itself',
     'they','them','their','theirs','themselves','what','which','who','whom','this','that','these','those',
     'as','because','until','than','too','very','not','no','nor','so','such','both','each','few','more','most','other','some','any','only','own','same','then','once',
     'about','again','further','here','there','when','where','why','how','all'
-}
+})
 STEMMER = PorterStemmer()
 
+# Porter stemming is pure Python; the set of distinct tokens is small, so
+# memoize per token
+_stem = lru_cache(maxsize=50000)(STEMMER.stem)
+
+# token -> stem table, pre-populated from the model vocabulary at startup so
+# the common case in clean_text is a plain dict lookup
+STEM_TABLE: Dict[str, str] = {}
+
+
+def load_stem_table(vocab: Iterable[str], stems: Optional[Dict[str, str]] = None) -> None:
+    """
+    Precompute Porter stems for the tokenizer vocabulary.
+    Tokens missing from the table are still stemmed (and memoized) on demand,
+    so clean_text output is identical with or without the table.
+
+    A tokenizer fit on stemmed text ships `stems`, the stem of every surface
+    form seen in training; that table is used as-is instead of stemming the
+    vocabulary (whose keys are already stems).
+    """
+    if stems is not None:
+        STEM_TABLE.update((word, stem) for word, stem in stems.items() if _token_pattern.fullmatch(word))
+    else:
+        STEM_TABLE.update((word, STEMMER.stem(word)) for word in vocab if _token_pattern.fullmatch(word))
+    # clean_text output depends on the table; drop anything cached before it
+    clean_text.cache_clear()
+
 
+# Only short bodies are memoized; large ones would pin their text in the cache
+@lru_cache_short(maxsize=4096, max_chars=4096)
 def clean_text(raw_text: str) -> str:
     """
     Perform robust NLP preprocessing for email content.
@@ -44,45 +82,82 @@ def clean_text(raw_text: str) -> str:
     if not raw_text:
         return ""
 
-    # Decode HTML entities and strip tags
-    text = html.unescape(raw_text)
-    text = _html_tag_pattern.sub(" ", text)
+    # Decode HTML entities, then swap tags/URLs/emails/etc. for special tokens.
+    # NUL becomes a space first, as in clean_text_batch (where it separates
+    # messages), so both give the same output
+    text = _replace_special_tokens(html.unescape(raw_text.replace(_BATCH_SEPARATOR, " ")))
 
-    # Preserve URLs and emails as special tokens instead of removing them
-    # This helps the model learn from these important spam indicators
+    # Lowercase and tokenize in one translate pass (faster than Punkt or regex)
+    return _stem_tokens(_tokenize(text))
+
+
+def clean_text_batch(raw_texts: List[str]) -> List[str]:
+    """
+    Batch form of clean_text for bulk scoring.
+    Messages are joined on a NUL separator so every substitution runs once
+    over the whole batch instead of once per message; the result is split
+    back into one cleaned string per input.
+    """
+    if not raw_texts:
+        return []
+    joined = _BATCH_SEPARATOR.join((text or "").replace(_BATCH_SEPARATOR, " ") for text in raw_texts)
+    text = _replace_special_tokens(html.unescape(joined))
+    return [_stem_tokens(_tokenize(part)) for part in text.split(_BATCH_SEPARATOR)]
+
+
+def _replace_special_tokens(text: str) -> str:
+    # Strip tags, then preserve URLs and emails as special tokens instead of
+    # removing them. This helps the model learn from these important spam indicators
+    text = _html_tag_pattern.sub(" ", text)
     text = _url_pattern.sub(" URL_TOKEN ", text)
     text = _email_pattern.sub(" EMAIL_TOKEN ", text)
     text = _phone_pattern.sub(" PHONE_TOKEN ", text)
     text = _currency_pattern.sub(" CURRENCY_TOKEN ", text)
+    return text
 
-    # Lowercase then fast regex tokenization (faster than Punkt)
-    text = text.lower()
-    tokens: List[str] = _token_pattern.findall(text)
 
-    # Stopword removal and stemming (fast, no corpora)
-    processed = []
-    for token in tokens:
-        if token in STOP_WORDS:
-            continue
-        stem = STEMMER.stem(token)
-        processed.append(stem)
+# bytes.translate table: ASCII letters -> lowercase, every other byte -> space
+_TOKEN_TRANS = bytes(b + 32 if 65 <= b <= 90 else b if 97 <= b <= 122 else 32 for b in range(256))
+# The only non-ASCII characters whose lowercase form contains ASCII letters
+# (dotted capital I, Kelvin sign)
+_LOWERS_TO_ASCII = frozenset('\u0130\u212a')
+
 
-    return " ".join(processed)
+def _tokenize(text: str) -> List[str]:
+    """
+    Same tokens as _token_pattern.findall(text.lower()), from a single C-level
+    translate pass instead of lower() plus a regex scan. Other non-ASCII
+    characters encode to '?' and split words just as the pattern does.
+    """
+    if not text.isascii() and not _LOWERS_TO_ASCII.isdisjoint(text):
+        return _token_pattern.findall(text.lower())
+    words = text.encode('ascii', 'replace').translate(_TOKEN_TRANS).decode('ascii').split()
+    return [word for word in words if len(word) > 1]
+
+
+def _stem_tokens(tokens: List[str]) -> str:
+    # Stopword removal and stemming (fast, no corpora)
+    return " ".join([STEM_TABLE.get(token) or _stem(token) for token in tokens if token not in STOP_WORDS])
 
 
-def extract_content_features(raw_text: str) -> Dict[str, float]:
+def extract_content_features(raw_text: str, urls: Optional[List[str]] = None,
+                             text_lower: Optional[str] = None) -> Dict[str, float]:
     """
     Extract content-based features that are strong indicators of spam/phishing.
     Returns a dictionary of feature scores (0.0 to 1.0).
+    Pass `urls` (URL_RE.findall(raw_text)) and `text_lower`
+    (lower_for_matching(raw_text)) when the caller already has them.
     """
     if not raw_text:
         return {}
     
     features = {}
-    text_lower = raw_text.lower()
+    if text_lower is None:
+        text_lower = lower_for_matching(raw_text)
     
     # URL-related features
-    urls = _url_pattern.findall(raw_text)
+    if urls is None:
+        urls = _url_pattern.findall(raw_text)
     features['url_count'] = min(len(urls) / 5.0, 1.0)  # Normalize to 0-1
     features['has_url'] = 1.0 if urls else 0.0
     
@@ -123,23 +198,24 @@ def extract_content_features(raw_text: str) -> Dict[str, float]:
     features['text_length_score'] = min(text_length / 2000.0, 1.0)
     
     # Capitalization features (common in spam)
-    caps_ratio = sum(1 for c in raw_text if c.isupper()) / max(len(raw_text), 1)
+    caps_count, exclamation_count = char_stats(raw_text)
+    caps_ratio = caps_count / max(len(raw_text), 1)
     features['caps_ratio'] = min(caps_ratio * 2, 1.0)  # Amplify for detection
     
     # Exclamation marks (common in spam)
-    exclamation_count = raw_text.count('!')
     features['exclamation_score'] = min(exclamation_count / 5.0, 1.0)
     
     return features
 
 
-def enhanced_clean_text(raw_text: str) -> Tuple[str, Dict[str, float]]:
+def enhanced_clean_text(raw_text: str, urls: Optional[List[str]] = None,
+                        text_lower: Optional[str] = None) -> Tuple[str, Dict[str, float]]:
     """
     Enhanced preprocessing that returns both cleaned text and content features.
     This allows the model to use both textual patterns and structured features.
     """
     cleaned = clean_text(raw_text)
-    features = extract_content_features(raw_text)
+    features = extract_content_features(raw_text, urls=urls, text_lower=text_lower)
     return cleaned, features
 
 
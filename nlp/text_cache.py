@@ -0,0 +1,24 @@
+from functools import lru_cache, wraps
+from typing import Callable
+
+
+def lru_cache_short(maxsize: int, max_chars: int = 4096) -> Callable:
+    """
+    lru_cache for functions of one text argument that only memoizes short
+    inputs. Request bodies and header blocks have no size limit, so a plain
+    cache would pin up to `maxsize` arbitrarily large strings (and results)
+    per worker; longer texts are computed uncached.
+    """
+    def decorator(func: Callable) -> Callable:
+        cached = lru_cache(maxsize=maxsize)(func)
+
+        @wraps(func)
+        def wrapper(text):
+            if text is not None and len(text) > max_chars:
+                return func(text)
+            return cached(text)
+
+        wrapper.cache_clear = cached.cache_clear
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+    return decorator
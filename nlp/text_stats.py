@@ -0,0 +1,45 @@
+import string
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit  # optional JIT for the per-character loop
+except Exception:
+    njit = None
+
+
+def _count_caps_and_exclamations(codes: np.ndarray) -> Tuple[int, int]:
+    caps = 0
+    exclamations = 0
+    for i in range(codes.shape[0]):
+        c = codes[i]
+        if 65 <= c <= 90:  # 'A'..'Z'
+            caps += 1
+        elif c == 33:  # '!'
+            exclamations += 1
+    return caps, exclamations
+
+
+if njit is not None:
+    _count_caps_and_exclamations = njit(cache=True)(_count_caps_and_exclamations)
+
+# Deleting A-Z via str.translate counts ASCII capitals in one C-level pass
+_DELETE_ASCII_UPPER = str.maketrans('', '', string.ascii_uppercase)
+
+
+def char_stats(text: str) -> Tuple[int, int]:
+    """
+    Return (uppercase letter count, exclamation mark count) for text.
+    ASCII text goes through the Numba kernel in one pass over the raw bytes,
+    or str.translate when Numba is not installed; anything else keeps the
+    Unicode-aware str.isupper count.
+    """
+    if not text:
+        return 0, 0
+    if text.isascii():
+        if njit is not None:
+            caps, exclamations = _count_caps_and_exclamations(np.frombuffer(text.encode('ascii'), dtype=np.uint8))
+            return int(caps), int(exclamations)
+        return len(text) - len(text.translate(_DELETE_ASCII_UPPER)), text.count('!')
+    return sum(map(str.isupper, text)), text.count('!')
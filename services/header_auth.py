@@ -1,12 +1,22 @@
 from typing import Dict, List
 import re
 
+from nlp.text_cache import lru_cache_short
+
+
+# Compiled once at import; building these per call went through re's
+# internal pattern cache on every parse
+_AUTH_RESULT_RES = {
+    name: re.compile(rf"{name}\s*=\s*(pass|fail|softfail|neutral|none|temperror|permerror|bestguesspass)", re.IGNORECASE)
+    for name in ('spf', 'dkim', 'dmarc')
+}
+_FROM_DOMAIN_RE = re.compile(r"@([\w.-]+)")
+
 
 def _unfold_headers(headers_text: str) -> List[str]:
     # Join folded header lines (continuation lines start with space or tab)
     lines = headers_text.splitlines()
     unfolded: List[str] = []
-    current = ''
     for line in lines:
         if line.startswith((' ', '\t')) and unfolded:
             unfolded[-1] = unfolded[-1] + ' ' + line.strip()
@@ -16,6 +26,12 @@ def _unfold_headers(headers_text: str) -> List[str]:
 
 
 def parse_auth_headers(headers_text: str) -> Dict:
+    # Return a copy so callers can't mutate the cached result
+    return dict(_parse_auth_headers(headers_text))
+
+
+@lru_cache_short(maxsize=1024, max_chars=8192)
+def _parse_auth_headers(headers_text: str) -> Dict:
     if not headers_text:
         return {
             'present': False,
@@ -40,7 +56,7 @@ def parse_auth_headers(headers_text: str) -> Dict:
     # Extract spf/dkim/dmarc statuses via regex
     def extract_auth_result(name: str) -> str:
         # e.g., spf=pass, dkim=fail, dmarc=pass
-        m = re.search(rf"{name}\s*=\s*(pass|fail|softfail|neutral|none|temperror|permerror|bestguesspass)", auth_results_text, re.IGNORECASE)
+        m = _AUTH_RESULT_RES[name].search(auth_results_text)
         if m:
             value = m.group(1).lower()
             if value in {'pass', 'bestguesspass'}:
@@ -85,7 +101,7 @@ def parse_auth_headers(headers_text: str) -> Dict:
     from_domain = None
     if 'from' in headers:
         joined = ' '.join(headers['from'])
-        m = re.search(r"@([\w.-]+)", joined)
+        m = _FROM_DOMAIN_RE.search(joined)
         if m:
             from_domain = m.group(1).lower()
 
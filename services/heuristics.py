@@ -1,7 +1,18 @@
 import re
-from typing import Dict, Optional, List
+import threading
+from itertools import islice
+from typing import Dict, Optional, List, Set
 from urllib.parse import urlparse
 
+from nlp.patterns import HTML_TAG_RE, URL_RE, lower_for_matching
+from nlp.text_stats import char_stats
+from nlp.text_cache import lru_cache_short
+
+try:
+    import hyperscan  # optional multi-pattern prefilter
+except Exception:
+    hyperscan = None
+
 
 # Enhanced phishing patterns for better content-only detection
 _PHISH_PATTERNS = [
@@ -59,7 +70,9 @@ _PHISH_PATTERNS = [
     r"w1nner-form",  # Common typo in spam
 ]
 
-_PHISH_REGEX = re.compile("|".join(_PHISH_PATTERNS), re.IGNORECASE)
+# The phrase regexes are matched case-sensitively against lower_for_matching()
+# output, which is much faster in `re` than re.IGNORECASE on the raw text
+_PHISH_REGEX = re.compile("|".join(_PHISH_PATTERNS))
 
 # Suspicious domain patterns
 _SUSPICIOUS_DOMAIN_PATTERNS = [
@@ -79,25 +92,126 @@ _SUSPICIOUS_DOMAIN_PATTERNS = [
 
 _SUSPICIOUS_DOMAIN_REGEX = re.compile("|".join(_SUSPICIOUS_DOMAIN_PATTERNS), re.IGNORECASE)
 
+# Urgency and prize cues; each list is compiled into one alternation so the
+# text is scanned once per category rather than once per pattern
+_URGENCY_PATTERNS = [
+    r"\b(?:urgent|immediate|asap|emergency|critical)\b",
+    r"\b(?:expire|expired|expiring|deadline)\b",
+    r"\b(?:limited time|act now|click now|verify now)\b",
+    r"\b(?:within \d+ hours?)\b",
+    r"\b(?:24 hours?|48 hours?)\b",
+    r"\b(?:permanently closed|suspended|blocked)\b",
+]
+
+_URGENCY_REGEX = re.compile("|".join(_URGENCY_PATTERNS))
+
+_PRIZE_PATTERNS = [
+    r"\b(?:winner|won|prize|reward|lottery|jackpot)\b",
+    r"\b(?:million|billion|thousand)\b",
+    r"\b(?:free|gift|bonus)\b",
+    r"\b(?:selected|chosen|lucky)\b",
+    r"\b(?:congratulations|congrats)\b",
+    r"\b(?:claim|collect|redeem)\b",
+    r"\b(?:reference number|claim code)\b",
+    r"\b(?:claims agent|promotions manager)\b",
+]
+
+_PRIZE_REGEX = re.compile("|".join(_PRIZE_PATTERNS))
+
+
+def _count_matches(regex, text: str, limit: Optional[int] = None) -> int:
+    # Count lazily instead of materializing a findall() list; `limit` stops
+    # the scan early when the caller only compares against a threshold
+    matches = regex.finditer(text)
+    if limit is not None:
+        matches = islice(matches, limit)
+    return sum(1 for _ in matches)
+
+
+# Optional Hyperscan prefilter: all phrase patterns live in one database that
+# is scanned in a single pass to find which categories can match at all, so
+# the `re` counters only run for categories that actually have hits
+_PREFILTER_CATEGORIES = (
+    ('phishing_phrases', _PHISH_PATTERNS),
+    ('urgency_indicators', _URGENCY_PATTERNS),
+    ('prize_lottery_indicators', _PRIZE_PATTERNS),
+)
+
+
+def _build_prefilter():
+    if hyperscan is None:
+        return None, ()
+    expressions: List[bytes] = []
+    categories: List[str] = []
+    for name, patterns in _PREFILTER_CATEGORIES:
+        for pattern in patterns:
+            expressions.append(pattern.encode('utf-8'))
+            categories.append(name)
+    # SINGLEMATCH: we only need to know whether a pattern occurs at all
+    flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8
+    try:
+        db = hyperscan.Database()
+        db.compile(expressions=expressions,
+                   ids=list(range(len(expressions))),
+                   elements=len(expressions),
+                   flags=[flags] * len(expressions))
+    except Exception:
+        return None, ()
+    return db, tuple(categories)
+
+
+_HS_DB, _HS_CATEGORIES = _build_prefilter()
+_HS_LOCAL = threading.local()
+
+
+def _prefilter_categories(text: str) -> Optional[Set[str]]:
+    """
+    Return the categories with at least one pattern hit, or None when the
+    Hyperscan prefilter is unavailable and every scorer has to run.
+    Non-ASCII text also returns None: without UCP, Hyperscan's digit/word
+    classes, word boundaries and caseless matching are ASCII-only while `re`
+    is Unicode-aware, so the prefilter could miss matches the scorers find.
+    """
+    if _HS_DB is None or not text.isascii():
+        return None
+    # Hyperscan scratch space must not be shared between threads
+    scratch = getattr(_HS_LOCAL, 'scratch', None)
+    if scratch is None:
+        scratch = _HS_LOCAL.scratch = hyperscan.Scratch(_HS_DB)
+    hits: Set[str] = set()
+
+    def on_match(pattern_id, start, end, flags, context):
+        hits.add(_HS_CATEGORIES[pattern_id])
 
-def phishing_phrase_score(text: str) -> float:
+    try:
+        _HS_DB.scan(text.encode('ascii'), match_event_handler=on_match, scratch=scratch)
+    except Exception:
+        return None
+    return hits
+
+
+def phishing_phrase_score(text: str, text_lower: Optional[str] = None) -> float:
+    # Not memoized: one compiled-alternation scan is cheap, and a cache keyed
+    # on (text, text_lower) would pin two copies of every body it holds
     if not text:
         return 0.0
-    matches = _PHISH_REGEX.findall(text)
+    if text_lower is None:
+        text_lower = lower_for_matching(text)
     # Cap influence; more matches → higher score up to 1.0
-    return float(min(1.0, 0.25 * len(matches)))
+    return float(min(1.0, 0.25 * _count_matches(_PHISH_REGEX, text_lower)))
 
 
-def analyze_url_suspiciousness(text: str) -> float:
+def analyze_url_suspiciousness(text: str, urls: Optional[List[str]] = None) -> float:
     """
     Analyze URLs in the text for suspicious patterns.
     Returns a score from 0.0 to 1.0 indicating suspiciousness.
+    Pass `urls` (URL_RE.findall(text)) when the caller already has them.
     """
     if not text:
         return 0.0
     
-    url_pattern = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
-    urls = url_pattern.findall(text)
+    if urls is None:
+        urls = URL_RE.findall(text)
     
     if not urls:
         return 0.0
@@ -143,17 +257,17 @@ def analyze_content_structure(text: str) -> float:
     score = 0.0
     
     # Check for excessive HTML
-    html_tags = re.findall(r'<[^>]+>', text)
-    if len(html_tags) > 10:
+    if _count_matches(HTML_TAG_RE, text, limit=11) > 10:
         score += 0.3
     
+    caps_count, exclamation_count = char_stats(text)
+
     # Check for excessive capitalization
-    caps_ratio = sum(1 for c in text if c.isupper()) / max(len(text), 1)
+    caps_ratio = caps_count / max(len(text), 1)
     if caps_ratio > 0.3:
         score += 0.2
     
     # Check for excessive exclamation marks
-    exclamation_count = text.count('!')
     if exclamation_count > 3:
         score += 0.2
     
@@ -172,69 +286,56 @@ def analyze_content_structure(text: str) -> float:
     return float(min(score, 1.0))
 
 
-def analyze_urgency_indicators(text: str) -> float:
+def analyze_urgency_indicators(text: str, text_lower: Optional[str] = None) -> float:
     """
     Analyze text for urgency indicators commonly used in spam/phishing.
     """
     if not text:
         return 0.0
+    if text_lower is None:
+        text_lower = lower_for_matching(text)
     
-    urgency_patterns = [
-        r'\b(urgent|immediate|asap|emergency|critical)\b',
-        r'\b(expire|expired|expiring|deadline)\b',
-        r'\b(limited time|act now|click now|verify now)\b',
-        r'\b(within \d+ hours?)\b',
-        r'\b(24 hours?|48 hours?)\b',
-        r'\b(permanently closed|suspended|blocked)\b',
-    ]
-    
-    urgency_score = 0.0
-    for pattern in urgency_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        urgency_score += len(matches) * 0.2
-    
-    return float(min(urgency_score, 1.0))
+    return float(min(_count_matches(_URGENCY_REGEX, text_lower) * 0.2, 1.0))
 
 
-def analyze_prize_lottery_indicators(text: str) -> float:
+def analyze_prize_lottery_indicators(text: str, text_lower: Optional[str] = None) -> float:
     """
     Analyze text for prize/lottery indicators commonly used in spam.
     """
     if not text:
         return 0.0
+    if text_lower is None:
+        text_lower = lower_for_matching(text)
     
-    prize_patterns = [
-        r'\b(winner|won|prize|reward|lottery|jackpot)\b',
-        r'\b(million|billion|thousand)\b',
-        r'\b(free|gift|bonus)\b',
-        r'\b(selected|chosen|lucky)\b',
-        r'\b(congratulations|congrats)\b',
-        r'\b(claim|collect|redeem)\b',
-        r'\b(reference number|claim code)\b',
-        r'\b(claims agent|promotions manager)\b',
-    ]
-    
-    prize_score = 0.0
-    for pattern in prize_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        prize_score += len(matches) * 0.15
-    
-    return float(min(prize_score, 1.0))
+    return float(min(_count_matches(_PRIZE_REGEX, text_lower) * 0.15, 1.0))
 
 
-def comprehensive_content_analysis(text: str) -> Dict[str, float]:
+def comprehensive_content_analysis(text: str, urls: Optional[List[str]] = None,
+                                   text_lower: Optional[str] = None) -> Dict[str, float]:
     """
     Perform comprehensive content analysis and return all feature scores.
+    Pass `urls` (URL_RE.findall(text)) and `text_lower` (lower_for_matching(text))
+    when the caller already has them.
     """
+    candidates = _prefilter_categories(text) if text else None
+    if text and text_lower is None:
+        text_lower = lower_for_matching(text)
+
+    def phrase_feature(name: str, scorer) -> float:
+        if candidates is not None and name not in candidates:
+            return 0.0
+        return scorer(text, text_lower)
+
     return {
-        'phishing_phrases': phishing_phrase_score(text),
-        'url_suspiciousness': analyze_url_suspiciousness(text),
+        'phishing_phrases': phrase_feature('phishing_phrases', phishing_phrase_score),
+        'url_suspiciousness': analyze_url_suspiciousness(text, urls=urls),
         'content_structure': analyze_content_structure(text),
-        'urgency_indicators': analyze_urgency_indicators(text),
-        'prize_lottery_indicators': analyze_prize_lottery_indicators(text),
+        'urgency_indicators': phrase_feature('urgency_indicators', analyze_urgency_indicators),
+        'prize_lottery_indicators': phrase_feature('prize_lottery_indicators', analyze_prize_lottery_indicators),
     }
 
 
+@lru_cache_short(maxsize=2048, max_chars=8192)
 def display_name_domain_mismatch(headers_text: str) -> float:
     """
     If From display name suggests a known brand (e.g., Microsoft, PayPal) but the domain is unrelated, raise risk.
@@ -261,14 +362,22 @@ ALLOWLIST_DOMAINS = set([
 ])
 
 
-def apply_allowlist(spam_score: float, headers_text: Optional[str]) -> float:
-    if not headers_text:
-        return spam_score
+@lru_cache_short(maxsize=2048, max_chars=8192)
+def _is_allowlisted_sender(headers_text: str) -> bool:
     m = re.search(r"From:\s*[^<]*<[^@>]+@([^>]+)>", headers_text, re.IGNORECASE)
     if not m:
-        return spam_score
+        return False
     domain = m.group(1).strip().lower()
-    if any(domain == d or domain.endswith('.' + d) for d in ALLOWLIST_DOMAINS):
+    # Check the domain and each parent suffix (a.b.c -> b.c -> c) against the
+    # set: O(labels) lookups regardless of allowlist size
+    labels = domain.split('.')
+    return any('.'.join(labels[i:]) in ALLOWLIST_DOMAINS for i in range(len(labels)))
+
+
+def apply_allowlist(spam_score: float, headers_text: Optional[str]) -> float:
+    if not headers_text:
+        return spam_score
+    if _is_allowlisted_sender(headers_text):
         # reduce small boosts to avoid false positives on well-known brands
         return float(max(0.0, spam_score - 0.1))
     return spam_score
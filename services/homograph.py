@@ -6,15 +6,19 @@ def detect_homograph(host: str) -> Dict:
     host = (host or '').lower()
     is_punycode = host.startswith('xn--') or '.xn--' in host
     decoded = None
-    try:
-        decoded = idna.decode(host)
-    except Exception:
-        decoded = None
+    if is_punycode or not host.isascii():
+        try:
+            decoded = idna.decode(host)
+        except Exception:
+            decoded = None
+    else:
+        # Plain ASCII hosts decode to themselves; skip the IDNA codec
+        decoded = host or None
 
     looks_like = None
     if decoded and decoded != host:
         # Simple check for mixed-script or confusable characters
-        mixed_script = any(ord(ch) > 127 for ch in decoded)
+        mixed_script = not decoded.isascii()
         looks_like = 'mixed-script' if mixed_script else None
 
     homograph_risk = 0.15 if is_punycode or looks_like else 0.0
@@ -1,11 +1,241 @@
+from __future__ import annotations
+
+import json
 import os
 import pickle
-from typing import Tuple, Dict
+import queue
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Tuple, Dict, List, Callable, Iterable, Optional
 
 import numpy as np
-from keras.models import load_model
-from keras.preprocessing.sequence import pad_sequences
-from typing import Optional
+
+from nlp.text_cache import lru_cache_short
+
+try:
+    # optional standalone TFLite runtime; serves the .tflite export without TensorFlow
+    from ai_edge_litert.interpreter import Interpreter as LiteRTInterpreter
+except Exception:
+    LiteRTInterpreter = None
+
+# TensorFlow (and Keras) is imported on first use by _import_tf: most of a
+# worker's private memory and several seconds of startup are the TF runtime
+# itself, not the model's weights, so a worker serving the TFLite export
+# through LiteRT never loads it
+tf = None
+# Thread pool sizes recorded by configure_tf_threading
+_TF_THREADS = {'intra_op': None, 'inter_op': 1}
+
+
+def _import_tf():
+    global tf
+    if tf is None:
+        import tensorflow
+        _apply_tf_threading(tensorflow)
+        tf = tensorflow
+    return tf
+
+
+def _apply_tf_threading(tensorflow) -> None:
+    try:
+        tensorflow.config.threading.set_intra_op_parallelism_threads(_TF_THREADS['intra_op'] or os.cpu_count() or 1)
+        tensorflow.config.threading.set_inter_op_parallelism_threads(_TF_THREADS['inter_op'])
+    except RuntimeError:
+        pass
+
+
+def configure_tf_threading(intra_op_threads: Optional[int] = None, inter_op_threads: int = 1) -> None:
+    """
+    Size TensorFlow's thread pools for single-request inference.
+    The sizes apply when TensorFlow is first imported, or immediately if it
+    already is; once an op has executed TensorFlow rejects the change and the
+    defaults stay in place. The TFLite interpreter uses the intra-op count.
+    The small Embedding -> LSTM -> Dense graph is a chain of dependent ops,
+    so one inter-op thread is enough and intra-op threads match the CPUs.
+    """
+    _TF_THREADS['intra_op'] = intra_op_threads or os.cpu_count() or 1
+    _TF_THREADS['inter_op'] = inter_op_threads
+    if tf is not None:
+        _apply_tf_threading(tf)
+    elif 'tensorflow' in sys.modules:
+        _import_tf()
+
+
+# Rough fixed cost of one forward pass, in padded (row x timestep) cells of
+# LSTM work; measured on CPU at ~0.45 ms per call vs ~1 us per cell
+PASS_OVERHEAD_STEPS = 512
+
+
+# Category output for single-head models; shared, so made read-only
+_NO_CATEGORIES = np.empty(0, dtype=np.float32)
+_NO_CATEGORIES.flags.writeable = False
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-text predictions into one batched forward
+    pass. A background thread takes the first queued request, keeps collecting
+    for up to `max_wait_ms` or until `max_batch` texts are queued, then runs
+    `predict_batch` once and resolves each caller's Future with its row.
+    """
+
+    def __init__(self, predict_batch: Callable[[List[str]], List[Tuple[float, np.ndarray]]], max_batch: int = 32, max_wait_ms: float = 2.0):
+        self._predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="lstm-batcher", daemon=True).start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = self._predict_batch([text for text, _ in items])
+            except Exception as exc:
+                for _, future in items:
+                    future.set_exception(exc)
+                continue
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+
+
+class Vocab:
+    """
+    Compact stand-in for a fitted Keras Tokenizer, loaded from the JSON
+    written by save_vocab: only the word -> index table and the settings
+    texts_to_sequences needs, instead of unpickling the whole Tokenizer with
+    its word counts and document indexes.
+    """
+
+    def __init__(self, word_index: Dict[str, int], oov_index: Optional[int] = None, filters: str = '',
+                 lower: bool = True, split: str = ' ', stem_table: Optional[Dict[str, str]] = None):
+        self.word_index = word_index
+        self.oov_index = oov_index
+        self.lower = lower
+        self.split = split
+        # surface form -> stem its word_index key was built from, for
+        # tokenizers fit on stemmed text (see load_stem_table)
+        self.stem_table = stem_table
+        self._filter_table = str.maketrans(dict.fromkeys(filters, split))
+
+    @classmethod
+    def load(cls, path: str) -> 'Vocab':
+        with open(path, encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+    def texts_to_sequences(self, texts: Iterable[str]) -> List[List[int]]:
+        # Same ids as Tokenizer.texts_to_sequences: save_vocab already dropped
+        # words past num_words, so a miss is either the OOV id or skipped
+        word_index = self.word_index
+        oov_index = self.oov_index
+        sequences = []
+        for text in texts:
+            if self.lower:
+                text = text.lower()
+            words = text.translate(self._filter_table).split(self.split)
+            if oov_index is None:
+                sequences.append([word_index[w] for w in words if w in word_index])
+            else:
+                sequences.append([word_index.get(w, oov_index) for w in words if w])
+        return sequences
+
+
+def save_vocab(tokenizer, path: str) -> None:
+    """
+    Write the parts of a fitted (word-level) Keras Tokenizer that inference
+    uses to a JSON file for Vocab.load.
+    """
+    if tokenizer.char_level:
+        raise ValueError("save_vocab only supports word-level tokenizers")
+    num_words = tokenizer.num_words
+    word_index = {w: i for w, i in tokenizer.word_index.items() if not num_words or i < num_words}
+    stem_table = getattr(tokenizer, 'stem_table', None)
+    if stem_table is not None:
+        stem_table = {w: stem for w, stem in sorted(stem_table.items()) if stem in word_index}
+    vocab = {
+        'word_index': word_index,
+        'oov_index': tokenizer.word_index.get(tokenizer.oov_token) if tokenizer.oov_token else None,
+        'filters': tokenizer.filters,
+        'lower': tokenizer.lower,
+        'split': tokenizer.split,
+        'stem_table': stem_table,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False)
+
+
+def export_tflite(model, path: str, max_len: int = 100) -> None:
+    """
+    Convert a trained Keras model to a TFLite flatbuffer for LSTMService.
+    Weights are quantized to int8 (dynamic-range quantization; activations
+    stay float). The LSTM only converts with a static batch, so the graph
+    takes one sequence of max_len tokens per invocation.
+    """
+    tf = _import_tf()
+    with tempfile.TemporaryDirectory() as export_dir:
+        model.export(export_dir, format='tf_saved_model', verbose=False,
+                     input_signature=[tf.TensorSpec([1, max_len], tf.int32)])
+        converter = tf.lite.TFLiteConverter.from_saved_model(export_dir)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        tflite_model = converter.convert()
+    with open(path, 'wb') as f:
+        f.write(tflite_model)
+
+
+class TFLiteRunner:
+    """
+    Runs a model written by export_tflite. Called with a padded batch like
+    the Keras model and returns [spam_scores, category_probs] (or just the
+    spam scores for single-head models), one interpreter invocation per row.
+    """
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        # Both interpreters mmap the flatbuffer, so workers share one copy of
+        # the weights through the page cache
+        interpreter_class = LiteRTInterpreter or _import_tf().lite.Interpreter
+        self._interpreter = interpreter_class(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        input_details = self._interpreter.get_input_details()[0]
+        self._input_index = input_details['index']
+        self.max_len = int(input_details['shape'][1])
+        # The converter doesn't keep the Keras output order; the spam head
+        # is the single-unit output
+        outputs = self._interpreter.get_output_details()
+        self._spam_index = next(d['index'] for d in outputs if d['shape'][-1] == 1)
+        self._category = next(((d['index'], int(d['shape'][-1])) for d in outputs if d['shape'][-1] != 1), None)
+        # The interpreter holds its tensors in place, so calls can't overlap
+        self._lock = threading.Lock()
+
+    def __call__(self, padded: np.ndarray):
+        padded = np.asarray(padded, dtype=np.int32)
+        spam_scores = np.empty((len(padded), 1), dtype=np.float32)
+        category_probs = np.empty((len(padded), self._category[1]), dtype=np.float32) if self._category else None
+        interpreter = self._interpreter
+        with self._lock:
+            for row in range(len(padded)):
+                interpreter.set_tensor(self._input_index, padded[row:row + 1])
+                interpreter.invoke()
+                spam_scores[row] = interpreter.get_tensor(self._spam_index)[0]
+                if category_probs is not None:
+                    category_probs[row] = interpreter.get_tensor(self._category[0])[0]
+        if category_probs is None:
+            return spam_scores
+        return [spam_scores, category_probs]
 
 
 class LSTMService:
@@ -15,28 +245,252 @@ class LSTMService:
     - Multi-class category distribution (if provided by model)
     """
 
-    def __init__(self, model_path: str, tokenizer_path: str, max_len: int = 100):
-        self.model = load_model(model_path)
-        with open(tokenizer_path, 'rb') as f:
-            self.tokenizer = pickle.load(f)
+    def __init__(self, model_path: str, tokenizer_path: str, max_len: int = 100, max_batch: int = 32, max_wait_ms: float = 2.0, lazy: bool = True):
+        self.model_path = model_path
+        self.tokenizer_path = tokenizer_path
         self.max_len = max_len
-        # Warm up the model once to initialize graph/kernels
+        self.max_batch = max_batch
+        # The model and tokenizer load on first use (lazy=True), so processes
+        # that never reach the LSTM don't pay for the Keras graph; the lock
+        # makes concurrent first requests wait for a single load
+        self._model = None
+        self._tokenizer = None
+        self._loaded = False
+        self._init_lock = threading.RLock()
+        # texts_to_sequences is a pure-Python loop over words; repeated
+        # messages reuse their token ids (tuples keep the entries compact).
+        # Only short texts are cached, as for clean_text
+        self._sequence = lru_cache_short(maxsize=4096, max_chars=4096)(self._tokenize_one)
+        # One scratch array that padded batches are written into, held by
+        # one pass at a time (see _predict_pass). threading.local would be
+        # per-greenlet under gevent and never reused
+        self._scratch = None
+        self._scratch_lock = threading.Lock()
+        self._batcher = None
+        # Concurrent predict() calls share one forward pass; max_batch=1
+        # disables batching and predicts inline on the calling thread. The
+        # TFLite runner invokes one row at a time anyway, so batching would
+        # only add the collection wait
+        if max_batch > 1 and not model_path.endswith('.tflite'):
+            self._batcher = MicroBatcher(self.predict_batch, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        if not lazy:
+            self._ensure_loaded()
+
+    @property
+    def tokenizer(self):
+        # Loads on its own: the vocabulary is cheap and needed at startup
+        # (stem table) even while the model is still unloaded
+        if self._tokenizer is None:
+            with self._init_lock:
+                if self._tokenizer is None:
+                    self._tokenizer = self._load_tokenizer()
+        return self._tokenizer
+
+    @property
+    def model(self):
+        self._ensure_loaded()
+        return self._model
+
+    def _load_tokenizer(self):
+        # JSON vocab from save_vocab, or a pickled Keras Tokenizer
+        if self.tokenizer_path.endswith('.json'):
+            return Vocab.load(self.tokenizer_path)
+        with open(self.tokenizer_path, 'rb') as f:
+            return pickle.load(f)
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._init_lock:
+            # Re-entered from warmup on the loading thread: already in place
+            if self._model is not None:
+                return
+            if self._tokenizer is None:
+                self._tokenizer = self._load_tokenizer()
+            # Everything is built in locals and published together, so a
+            # failed load leaves the service unloaded and the next call
+            # retries (and reports the same error) instead of half-working
+            if self.model_path.endswith('.tflite'):
+                # Quantized TFLite graph (export_tflite): fixed input length,
+                # no tf.function/XLA
+                model = TFLiteRunner(self.model_path, num_threads=_TF_THREADS['intra_op'] or os.cpu_count())
+                if model.max_len != self.max_len:
+                    raise ValueError(f"{self.model_path} takes {model.max_len} tokens, expected max_len={self.max_len}")
+                length_buckets = (self.max_len,)
+                infer, xla = None, False
+            else:
+                _import_tf()
+                from keras.models import load_model
+                model = load_model(self.model_path)
+                length_buckets = self._length_buckets(model)
+                infer, xla = self._build_infer(model, length_buckets)
+            self.length_buckets = length_buckets
+            self._infer, self._xla = infer, xla
+            self._model = model
+            self.warmup()
+            self._loaded = True
+
+    def _length_buckets(self, model) -> Tuple[int, ...]:
+        """
+        Sequence lengths to pad batches to. Shorter buckets are only safe when
+        the model takes variable-length input and masks the zero padding;
+        otherwise the leading pad timesteps feed the LSTM state and every
+        batch has to be padded to max_len exactly as in training.
+        """
+        input_shape = model.input_shape
+        if isinstance(input_shape, list) or input_shape[1] is not None:
+            return (self.max_len,)
+        if not any(getattr(layer, 'mask_zero', False) for layer in model.layers):
+            return (self.max_len,)
+        return tuple(b for b in (16, 32, 64) if b < self.max_len) + (self.max_len,)
+
+    def _build_infer(self, model, length_buckets: Tuple[int, ...]):
+        """
+        Trace the forward pass once as a tf.function, which skips the
+        per-call dispatch overhead of model.predict. XLA compilation is tried
+        first; returns (None, False) if neither variant runs, leaving
+        predict_batch on model.predict.
+        """
+        timesteps = self.max_len if len(length_buckets) == 1 else None
+        signature = [tf.TensorSpec([None, timesteps], tf.int32)]
+        for jit_compile in (True, False):
+            infer = tf.function(lambda x: model(x, training=False),
+                                jit_compile=jit_compile, input_signature=signature)
+            try:
+                infer(tf.ones([1, self.max_len], tf.int32))
+            except Exception:
+                continue
+            return infer, jit_compile
+        return None, False
+
+    def warmup(self) -> None:
+        # Run predictions through the full tokenize -> pad -> predict path
+        # so graph tracing and kernel setup happen before the first request;
+        # XLA compiles once per input shape, so cover every padded batch size
+        # at max_len and every length bucket for single requests (other
+        # combinations compile on first use)
         try:
-            _ = self.model.predict(pad_sequences([[0]], maxlen=self.max_len), verbose=0)
+            self.predict_batch(["warmup"])
+            if self._xla:
+                size = 2
+                while size < self.max_batch * 2:
+                    self._predict_padded(np.ones((size, self.max_len), dtype=np.int32))
+                    size *= 2
+                for length in self.length_buckets:
+                    self._predict_padded(np.ones((1, length), dtype=np.int32))
         except Exception:
             pass
 
+    def _tokenize_one(self, text: str) -> Tuple[int, ...]:
+        # Padding keeps only the last max_len ids, so that is all we store
+        return tuple(self.tokenizer.texts_to_sequences([text])[0][-self.max_len:])
+
     def predict(self, text: str) -> Tuple[float, np.ndarray]:
-        seq = self.tokenizer.texts_to_sequences([text])
-        padded = pad_sequences(seq, maxlen=self.max_len)
-        preds = self.model.predict(padded, verbose=0)
-        if isinstance(preds, list) or isinstance(preds, tuple):
-            spam_prob = float(preds[0][0][0])
-            category_probs = np.array(preds[1][0])
+        if self._batcher is None:
+            return self.predict_batch([text])[0]
+        return self._batcher.submit(text).result()
+
+    def predict_batch(self, texts: List[str]) -> List[Tuple[float, np.ndarray]]:
+        """
+        Score several texts with one tokenize -> pad -> predict pass,
+        bypassing the micro-batching queue.
+        """
+        if not texts:
+            return []
+        self._ensure_loaded()
+        seqs = [self._sequence(text) for text in texts]
+        # Sort texts into length buckets so short texts in a mixed batch don't
+        # pay for the longest one; longer texts are truncated to max_len as
+        # before. A shorter bucket only gets its own forward pass when that
+        # saves more padding than the cost of an extra pass, otherwise it is
+        # padded along with the next longer one.
+        groups: Dict[int, List[int]] = {}
+        for i, seq in enumerate(seqs):
+            maxlen = next((b for b in self.length_buckets if b >= len(seq)), self.max_len)
+            groups.setdefault(maxlen, []).append(i)
+        passes: List[Tuple[int, List[int]]] = []
+        for maxlen in sorted(groups, reverse=True):
+            indices = groups[maxlen]
+            if passes and len(indices) * (passes[-1][0] - maxlen) < PASS_OVERHEAD_STEPS:
+                passes[-1][1].extend(indices)
+            else:
+                passes.append((maxlen, indices))
+        results: List[Tuple[float, np.ndarray]] = [None] * len(texts)
+        for maxlen, indices in passes:
+            preds = self._predict_pass([seqs[i] for i in indices], maxlen)
+            # Category rows are returned as views into the batch output
+            # rather than copied
+            if isinstance(preds, list) or isinstance(preds, tuple):
+                spam_scores, category_probs = preds[0], preds[1]
+                for row, i in enumerate(indices):
+                    results[i] = (float(spam_scores[row][0]), category_probs[row])
+            else:
+                for row, i in enumerate(indices):
+                    results[i] = (float(preds[row][0]), _NO_CATEGORIES)
+        return results
+
+    def _predict_pass(self, seqs: List[Tuple[int, ...]], maxlen: int):
+        """
+        Pad and predict one pass. The batcher thread and TFLite callers (which
+        the runner serializes anyway) reuse the shared scratch array; a pass
+        that finds it busy pads into a fresh array rather than waiting.
+        """
+        if self._scratch_lock.acquire(blocking=False):
+            try:
+                return self._predict_padded(self._pad_batch(seqs, maxlen, reuse=True))
+            finally:
+                self._scratch_lock.release()
+        return self._predict_padded(self._pad_batch(seqs, maxlen, reuse=False))
+
+    def _pad_batch(self, seqs: List[Tuple[int, ...]], maxlen: int, reuse: bool = False) -> np.ndarray:
+        """
+        Pad sequences the way Keras pad_sequences does by default (zeros in
+        front, longer sequences keep their last maxlen ids). With reuse the
+        rows are written into the shared scratch array, grown to the largest
+        pass seen; the caller must hold _scratch_lock until it is done with
+        the result. For XLA the rows are rounded up to a power of two (extra
+        rows are zero and their outputs ignored), so it reuses a handful of
+        compiled shapes.
+        """
+        rows = len(seqs)
+        if self._xla:
+            rows = 1 << (rows - 1).bit_length()
+        size = rows * maxlen
+        if reuse:
+            if self._scratch is None or self._scratch.size < size:
+                self._scratch = np.empty(size, dtype=np.int32)
+            padded = self._scratch[:size].reshape(rows, maxlen)
+            padded.fill(0)
         else:
-            spam_prob = float(preds[0][0])
-            category_probs = np.array([])
-        return spam_prob, category_probs
+            padded = np.zeros((rows, maxlen), dtype=np.int32)
+        for row, seq in enumerate(seqs):
+            if seq:
+                seq = seq[-maxlen:]
+                padded[row, maxlen - len(seq):] = seq
+        return padded
+
+    def _predict_padded(self, padded: np.ndarray):
+        if isinstance(self._model, TFLiteRunner):
+            return self._model(padded)
+        if self._infer is None:
+            return self._model.predict(padded, batch_size=len(padded), verbose=0)
+        preds = self._infer(tf.convert_to_tensor(padded, dtype=tf.int32))
+        if isinstance(preds, list) or isinstance(preds, tuple):
+            return [p.numpy() for p in preds]
+        return preds.numpy()
+
+
+def _clip01(value: float) -> float:
+    # Plain comparisons: np.clip's ufunc dispatch costs far more on a scalar
+    return 0.0 if value < 0.0 else 1.0 if value > 1.0 else float(value)
+
+
+# Header risk per auth check and result; 'pass' (or anything unlisted) adds nothing
+_HEADER_RISK = {
+    'spf': {'fail': 0.4, 'unknown': 0.05},
+    'dkim': {'fail': 0.35, 'unknown': 0.05},
+    'dmarc': {'fail': 0.5, 'unknown': 0.05},
+}
 
 
 class EnsembleService:
@@ -45,28 +499,22 @@ class EnsembleService:
     additional heuristics (e.g., URL risk) for improved robustness.
     """
 
-    def __init__(self, lstm_service: LSTMService, url_weight: float = 0.25, header_weight: float = 0.35, phrase_weight: float = 0.15, display_weight: float = 0.10):
+    def __init__(self, lstm_service: LSTMService, url_weight: float = 0.25, header_weight: float = 0.35, phrase_weight: float = 0.15, display_weight: float = 0.10,
+                 short_circuit: bool = True, ham_bound: float = 0.3, spam_bound: float = 0.85):
         self.lstm = lstm_service
         self.url_weight = url_weight
         self.header_weight = header_weight
         self.phrase_weight = phrase_weight
         self.display_weight = display_weight
+        # Blends certain to stay below ham_bound or above spam_bound are
+        # decided without the LSTM; the app's 0.35/0.45 thresholds (and the
+        # 0.1 allowlist discount) sit well inside that band
+        self.short_circuit = short_circuit
+        self.ham_bound = ham_bound
+        self.spam_bound = spam_bound
 
-    def blend(self, cleaned_text: str, url_risk_score: float, header_findings: Optional[Dict] = None, phrase_score: float = 0.0, display_mismatch: float = 0.0, content_features: Optional[Dict] = None) -> Dict[str, float]:
-        spam_prob, category_probs = self.lstm.predict(cleaned_text)
-
-        # Header-based risk: penalize fail signals; unknown contributes little
-        header_risk = 0.0
-        has_headers = header_findings and header_findings.get('present')
-        if has_headers:
-            spf = header_findings.get('spf', 'unknown')
-            dkim = header_findings.get('dkim', 'unknown')
-            dmarc = header_findings.get('dmarc', 'unknown')
-            header_risk += 0.4 if spf == 'fail' else (0.05 if spf == 'unknown' else 0.0)
-            header_risk += 0.35 if dkim == 'fail' else (0.05 if dkim == 'unknown' else 0.0)
-            header_risk += 0.5 if dmarc == 'fail' else (0.05 if dmarc == 'unknown' else 0.0)
-            header_risk = float(np.clip(header_risk, 0.0, 1.0))
-
+    @staticmethod
+    def content_risk(content_features: Optional[Dict]) -> float:
         # Content-based features (when no headers available, rely more on content)
         content_risk = 0.0
         if content_features:
@@ -76,19 +524,35 @@ class EnsembleService:
             content_risk += content_features.get('suspicious_action_score', 0.0) * 0.2
             content_risk += content_features.get('has_url', 0.0) * 0.15
             content_risk += content_features.get('has_currency', 0.0) * 0.1
-            content_risk = float(np.clip(content_risk, 0.0, 1.0))
+            content_risk = _clip01(content_risk)
+        return content_risk
+
+    def blend(self, cleaned_text: str, url_risk_score: float, header_findings: Optional[Dict] = None, phrase_score: float = 0.0, display_mismatch: float = 0.0, content_features: Optional[Dict] = None,
+              allow_short_circuit: bool = True) -> Dict[str, float]:
+        """
+        Pass allow_short_circuit=False when a later rule may override the
+        result, so the model still runs and its category is available.
+        """
+        # Header-based risk: penalize fail signals; unknown contributes little
+        header_risk = 0.0
+        has_headers = header_findings and header_findings.get('present')
+        if has_headers:
+            header_risk = sum(_HEADER_RISK[check].get(header_findings.get(check, 'unknown'), 0.0)
+                              for check in _HEADER_RISK)
+            header_risk = _clip01(header_risk)
+
+        content_risk = self.content_risk(content_features)
 
         # Adaptive weighting: when no headers, give much more weight to LSTM
         if has_headers:
             # With headers: use original weights
             base_weight = 1.0 - self.url_weight - self.header_weight - self.phrase_weight - self.display_weight - 0.2
-            base_weight = max(0.0, base_weight)
-            blended_spam = (
-                base_weight * spam_prob
-                + self.url_weight * url_risk_score
+            lstm_weight = max(0.0, base_weight)
+            other_risk = (
+                self.url_weight * url_risk_score
                 + self.header_weight * header_risk
-                + self.phrase_weight * float(np.clip(phrase_score, 0.0, 1.0))
-                + self.display_weight * float(np.clip(display_mismatch, 0.0, 1.0))
+                + self.phrase_weight * _clip01(phrase_score)
+                + self.display_weight * _clip01(display_mismatch)
                 + 0.2 * content_risk
             )
         else:
@@ -97,19 +561,32 @@ class EnsembleService:
             url_weight = 0.15   # 15% to URL risk
             content_weight = 0.15  # 15% to content features
             
-            blended_spam = (
-                lstm_weight * spam_prob
-                + url_weight * url_risk_score
+            other_risk = (
+                url_weight * url_risk_score
                 + content_weight * content_risk
             )
-        
-        blended_spam = float(np.clip(blended_spam, 0.0, 1.0))
+
+        # The blend is linear in spam_prob, which lies in [0, 1]: if even the
+        # full LSTM range can't lift it to ham_bound, or can't pull it below
+        # spam_bound, skip the model call and report the midpoint
+        if self.short_circuit and allow_short_circuit and (other_risk + lstm_weight < self.ham_bound or other_risk > self.spam_bound):
+            return {
+                'spam_prob': _clip01(other_risk + 0.5 * lstm_weight),
+                'raw_spam_prob': None,
+                'category_probs': [],
+                'content_risk': content_risk,
+                'short_circuit': True
+            }
+
+        spam_prob, category_probs = self.lstm.predict(cleaned_text)
+        blended_spam = _clip01(other_risk + lstm_weight * spam_prob)
 
         return {
             'spam_prob': blended_spam,
             'raw_spam_prob': float(spam_prob),
             'category_probs': category_probs.tolist() if category_probs.size else [],
-            'content_risk': content_risk
+            'content_risk': content_risk,
+            'short_circuit': False
         }
 
 
@@ -1,23 +1,41 @@
 import re
+import socket
 from urllib.parse import urlparse
 from typing import List, Dict
 
 
+# Compiled once at import instead of re-parsed on every call
+_URL_REGEX = re.compile(r"https?://[\w\-\.\:/%\?&#=~+;,@!$'\(\)\*]+", re.IGNORECASE)
+SUSPICIOUS_TLDS = frozenset({"zip", "mov", "click", "work", "xyz", "top", "casa"})
+
+
 def extract_urls(text: str) -> List[str]:
-    url_regex = r"(https?://[\w\-\.\:/%\?&#=~+;,@!$'\(\)\*]+)"
-    return re.findall(url_regex, text or '', flags=re.IGNORECASE)
+    return _URL_REGEX.findall(text or '')
+
+
+def _is_ipv4(host: str) -> bool:
+    # libc's parser also accepts the hex/octal spellings browsers resolve
+    # (0x7f.0.0.1) and rejects out-of-range octets; requiring four parts
+    # skips shorthand like "127.1". Hostnames rarely start with a digit, so
+    # check that first rather than paying for the exception
+    if not host[:1].isdigit():
+        return False
+    try:
+        socket.inet_aton(host)
+    except (OSError, ValueError):
+        return False
+    return host.count('.') == 3
 
 
 def analyze_urls(urls: List[str]) -> List[Dict]:
     findings = []
-    suspicious_tlds = {"zip", "mov", "click", "work", "xyz", "top", "casa"}
     for url in urls[:25]:
         parsed = urlparse(url)
         host = (parsed.netloc or '').lower()
         is_punycode = 'xn--' in host
-        tld = host.split('.')[-1] if '.' in host else ''
-        is_suspicious_tld = tld in suspicious_tlds
-        has_ip_host = re.match(r"^\d{1,3}(?:\.\d{1,3}){3}$", host.split(':')[0] if host else '') is not None
+        tld = host.rpartition('.')[2] if '.' in host else ''
+        is_suspicious_tld = tld in SUSPICIOUS_TLDS
+        has_ip_host = _is_ipv4(host.partition(':')[0])
         path_depth = len([p for p in (parsed.path or '').split('/') if p])
         long_query = len(parsed.query or '') > 80
         findings.append({
@@ -32,17 +50,26 @@ def analyze_urls(urls: List[str]) -> List[Dict]:
     return findings
 
 
+# Per-URL risk weight for each finding flag, applied in this order
+_URL_RISK_WEIGHTS = (
+    ('is_suspicious_tld', 0.15),
+    ('has_ip_host', 0.10),
+    ('is_punycode', 0.05),
+    ('deep_path', 0.05),
+    ('long_query', 0.05),
+)
+
+
+def _url_flag(finding: Dict, key: str) -> bool:
+    if key == 'deep_path':
+        return (finding.get('path_depth', 0) or 0) > 4
+    return bool(finding.get(key))
+
+
 def compute_url_risk(findings: List[Dict]) -> float:
     if not findings:
         return 0.0
-    risk = 0.0
-    for f in findings:
-        risk += 0.15 if f.get('is_suspicious_tld') else 0.0
-        risk += 0.10 if f.get('has_ip_host') else 0.0
-        risk += 0.05 if f.get('is_punycode') else 0.0
-        risk += 0.05 if (f.get('path_depth', 0) or 0) > 4 else 0.0
-        risk += 0.05 if f.get('long_query') else 0.0
-    risk = min(1.0, risk)
-    return float(risk)
+    risk = sum(weight for f in findings for key, weight in _URL_RISK_WEIGHTS if _url_flag(f, key))
+    return float(min(1.0, risk))
 
 
@@ -1,7 +1,12 @@
-import socket
+import asyncio
+import re
 import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
-from typing import Dict, Optional, Any
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Tuple
 
 try:
     import whois  # python-whois
@@ -18,8 +23,23 @@ try:
 except Exception:
     date_parser = None
 
-# Simple in-memory cache to reduce latency and rate-limit issues
-_WHOIS_CACHE: Dict[str, Dict[str, Any]] = {}
+# Process-wide WHOIS cache to reduce latency and rate-limit issues:
+# registrable domain -> (expiry on the monotonic clock, creation date or None).
+# Failed lookups expire sooner so a transient WHOIS error isn't kept all day;
+# ages are computed from the cached creation date, so they never go stale
+_WHOIS_TTL_SECONDS = 86400
+_WHOIS_NEGATIVE_TTL_SECONDS = 3600
+_WHOIS_CACHE_SIZE = 10000
+_WHOIS_CACHE: Dict[str, Tuple[float, Optional[datetime]]] = {}
+_WHOIS_LOCK = threading.Lock()
+# Domains with a lookup in flight; concurrent callers wait on its Event
+# instead of sending their own query
+_WHOIS_INFLIGHT: Dict[str, threading.Event] = {}
+
+# Shared pool for running WHOIS alongside the TLS handshake; a lookup that
+# outlives the timeout keeps running and still fills the cache
+_IO_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="whois-tls")
+_WHOIS_RESULT_TIMEOUT = 10.0
 
 
 def _registrable_domain(host: str) -> Optional[str]:
@@ -51,63 +71,170 @@ def _normalize_creation_date(value: Any) -> Optional[datetime]:
         return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
     # Strings or other
     if isinstance(value, (str, bytes)):
-        s = value.decode() if isinstance(value, bytes) else value
-        if date_parser is not None:
-            try:
-                dt = date_parser.parse(s)
-                return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
-            except Exception:
-                return None
-        # Fallback: common formats
-        for fmt in ("%Y-%m-%d", "%d-%b-%Y", "%Y.%m.%d", "%Y/%m/%d"):
+        return _parse_date_string(value.decode() if isinstance(value, bytes) else value)
+    return None
+
+
+# Bare year-month-day with any of the separators registrars use
+_DATE_RE = re.compile(r"(\d{4})[-./](\d{1,2})[-./](\d{1,2})")
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_string(s: str) -> Optional[datetime]:
+    # ISO 8601 and plain Y-m-d dates take C-level fast paths; dateutil (or
+    # strptime without it) only sees the remaining formats
+    s = s.strip()
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        dt = None
+    if dt is None:
+        match = _DATE_RE.fullmatch(s)
+        if match:
             try:
-                dt = datetime.strptime(s, fmt).replace(tzinfo=timezone.utc)
-                return dt
-            except Exception:
-                continue
+                dt = datetime(*map(int, match.groups()))
+            except ValueError:
+                dt = None
+    if dt is not None:
+        return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    if date_parser is not None:
+        try:
+            dt = date_parser.parse(s)
+            return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+        except Exception:
+            return None
+    # Fallback: common formats
+    for fmt in ("%Y-%m-%d", "%d-%b-%Y", "%Y.%m.%d", "%Y/%m/%d"):
+        try:
+            dt = datetime.strptime(s, fmt).replace(tzinfo=timezone.utc)
+            return dt
+        except Exception:
+            continue
     return None
 
 
+def _store_creation_date(registrable: str, created: Optional[datetime]) -> None:
+    # Caller holds _WHOIS_LOCK
+    now = time.monotonic()
+    _WHOIS_CACHE.pop(registrable, None)
+    if len(_WHOIS_CACHE) >= _WHOIS_CACHE_SIZE:
+        for domain in [d for d, (expires, _) in _WHOIS_CACHE.items() if expires <= now]:
+            del _WHOIS_CACHE[domain]
+    if len(_WHOIS_CACHE) >= _WHOIS_CACHE_SIZE:
+        # Still full: drop the oldest entry (dicts keep insertion order)
+        del _WHOIS_CACHE[next(iter(_WHOIS_CACHE))]
+    ttl = _WHOIS_TTL_SECONDS if created else _WHOIS_NEGATIVE_TTL_SECONDS
+    _WHOIS_CACHE[registrable] = (now + ttl, created)
+
+
+def _whois_creation_date(registrable: str) -> Optional[datetime]:
+    while True:
+        with _WHOIS_LOCK:
+            cached = _WHOIS_CACHE.get(registrable)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            event = _WHOIS_INFLIGHT.get(registrable)
+            if event is None:
+                event = _WHOIS_INFLIGHT[registrable] = threading.Event()
+                break
+        # Another thread is querying this domain; reuse its result
+        event.wait()
+
+    created = None
+    try:
+        data = whois.whois(registrable)
+        created = _normalize_creation_date(getattr(data, 'creation_date', None))
+    except Exception:
+        created = None
+    finally:
+        with _WHOIS_LOCK:
+            _store_creation_date(registrable, created)
+            del _WHOIS_INFLIGHT[registrable]
+        event.set()
+    return created
+
+
 def get_domain_age_days(host_or_domain: str) -> Optional[int]:
     if whois is None:
         return None
     registrable = _registrable_domain(host_or_domain)
     if not registrable:
         return None
-    if registrable in _WHOIS_CACHE:
-        cached = _WHOIS_CACHE[registrable]
-        return cached.get('age_days')
+    created = _whois_creation_date(registrable)
+    if not created:
+        return None
+    return int((datetime.now(timezone.utc) - created).days)
+
+
+# TLS handshakes run as coroutines on one background event loop, so the
+# handshakes for several hosts overlap instead of queuing on sockets
+_TLS_TIMEOUT = 4.0
+_TLS_CONTEXT: Optional[ssl.SSLContext] = None
+_TLS_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_TLS_LOOP_LOCK = threading.Lock()
+
+
+def _tls_loop() -> asyncio.AbstractEventLoop:
+    # Started on first use; contexts are safe to share across handshakes
+    global _TLS_CONTEXT, _TLS_LOOP
+    with _TLS_LOOP_LOCK:
+        if _TLS_LOOP is None:
+            _TLS_CONTEXT = ssl.create_default_context()
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="tls-fetch", daemon=True).start()
+            _TLS_LOOP = loop
+    return _TLS_LOOP
+
+
+async def _fetch_tls_cn_async(host: str, port: int = 443, timeout: float = _TLS_TIMEOUT) -> Optional[str]:
     try:
-        data = whois.whois(registrable)
-        created = _normalize_creation_date(getattr(data, 'creation_date', None))
-        if not created:
-            _WHOIS_CACHE[registrable] = {'age_days': None}
-            return None
-        age = (datetime.now(timezone.utc) - created).days
-        age_days = int(age)
-        _WHOIS_CACHE[registrable] = {'age_days': age_days}
-        return age_days
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=_TLS_CONTEXT, server_hostname=host), timeout)
     except Exception:
-        _WHOIS_CACHE[registrable] = {'age_days': None}
         return None
+    try:
+        cert = writer.get_extra_info('peercert') or {}
+        subject = dict(x[0] for x in cert.get('subject', []))
+        return subject.get('commonName')
+    except Exception:
+        return None
+    finally:
+        writer.close()
 
 
-def fetch_tls_cn(host: str, port: int = 443) -> Optional[str]:
+def fetch_tls_cns(hosts: List[str], port: int = 443) -> List[Optional[str]]:
+    """
+    Fetch the certificate commonName for every host concurrently; each entry
+    is None when the connection or handshake fails or times out.
+    """
+    if not hosts:
+        return []
+
+    async def fetch_all():
+        return await asyncio.gather(*(_fetch_tls_cn_async(host, port) for host in hosts))
+
+    future = asyncio.run_coroutine_threadsafe(fetch_all(), _tls_loop())
     try:
-        ctx = ssl.create_default_context()
-        with socket.create_connection((host, port), timeout=4) as sock:
-            with ctx.wrap_socket(sock, server_hostname=host) as ssock:
-                cert = ssock.getpeercert()
-                subject = dict(x[0] for x in cert.get('subject', []))
-                return subject.get('commonName')
+        return future.result(timeout=_TLS_TIMEOUT + 1)
     except Exception:
-        return None
+        future.cancel()
+        return [None] * len(hosts)
+
+
+def fetch_tls_cn(host: str, port: int = 443) -> Optional[str]:
+    return fetch_tls_cns([host], port)[0]
 
 
 def assess_whois_tls(host: str) -> Dict:
     domain = (host or '').split(':')[0]
-    age_days = get_domain_age_days(domain)
+    # WHOIS and the TLS handshake are independent round trips: run WHOIS on
+    # the pool while this thread does the handshake
+    age_future = _IO_POOL.submit(get_domain_age_days, domain)
     tls_cn = fetch_tls_cn(domain)
+    try:
+        age_days = age_future.result(timeout=_WHOIS_RESULT_TIMEOUT)
+    except FutureTimeoutError:
+        age_days = None
 
     # Simple heuristic risk from age
     age_risk = 0.0
@@ -0,0 +1,3 @@
+# WSGI entry point for production serving:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+from app import app